@@ -19,6 +19,10 @@ from PIL import Image, ImageDraw, ImageFont
 
 import streamlit as st
 
+# Share the backend's array-backed gallery instead of keeping a dict of encodings
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+from gallery import Gallery  # noqa: E402
+
 # Lazy import heavy libs to improve startup messages and error handling
 try:
     import cv2  # type: ignore
@@ -34,6 +38,8 @@ except Exception as e:  # pragma: no cover - optional at import
 
 TOLERANCE = 0.6
 KNOWN_FACES_DIR = os.path.join(os.path.dirname(__file__), "known_faces")
+# float64 (default), float32, float16 or int8; see backend/gallery.py
+GALLERY_STORAGE = os.getenv("GALLERY_STORAGE", "float64")
 
 # ---------------------- Utils ----------------------
 
@@ -58,10 +64,10 @@ def _ndarray_to_pil(arr: np.ndarray) -> Image.Image:
 
 # ---------------------- Core Logic ----------------------
 
-def load_known_faces() -> Dict[str, np.ndarray]:
+def load_known_faces() -> Gallery:
     """Load known faces from KNOWN_FACES_DIR.
 
-    Returns a dict mapping lowercase name -> encoding (128-d vector)
+    Returns a Gallery of lowercase names and their encodings (128-d vectors).
     If multiple faces in one image, take the first encoding only.
     Skips files that do not contain a detectable face.
     """
@@ -74,7 +80,7 @@ def load_known_faces() -> Dict[str, np.ndarray]:
 
     if not os.path.isdir(KNOWN_FACES_DIR):
         os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
-        return known
+        return Gallery([], [], mode=GALLERY_STORAGE)
 
     for fname in os.listdir(KNOWN_FACES_DIR):
         fpath = os.path.join(KNOWN_FACES_DIR, fname)
@@ -94,40 +100,32 @@ def load_known_faces() -> Dict[str, np.ndarray]:
             # Skip corrupted or unreadable files
             continue
 
-    return known
+    return Gallery(list(known.keys()), list(known.values()), mode=GALLERY_STORAGE)
 
 
-def _match_face(known_encs: Dict[str, np.ndarray], encoding: np.ndarray) -> Tuple[str, float]:
+def _match_face(known_encs: Gallery, encoding: np.ndarray) -> Tuple[str, float]:
     """Compare encoding to known faces.
 
     Returns (name, confidence_percent). If no match within tolerance, returns ("Unknown", 0.0).
     """
-    if not known_encs:
-        return "Unknown", 0.0
-
-    names = list(known_encs.keys())
-    encs = np.stack([known_encs[n] for n in names], axis=0)
-
-    matches = face_recognition.compare_faces(encs, encoding, tolerance=TOLERANCE)
-    distances = face_recognition.face_distance(encs, encoding)
-
-    if len(distances) == 0:
+    idx, distances = known_encs.search(encoding, k=1)
+    if idx.shape[1] == 0:
         return "Unknown", 0.0
 
-    best_idx = int(np.argmin(distances))
-    best_dist = float(distances[best_idx])
+    best_idx = int(idx[0, 0])
+    best_dist = float(distances[0, 0])
 
-    if matches[best_idx] and best_dist < TOLERANCE:
+    if best_dist < TOLERANCE:
         # Convert distance to a rough confidence (heuristic)
         # Map [0, TOLERANCE] to [100, ~60] approximately
         conf = max(0.0, 1.0 - best_dist / TOLERANCE)  # 1 at 0, 0 at tolerance
         confidence = 60.0 + conf * 40.0  # 60-100%
-        return names[best_idx], confidence
+        return known_encs.names[best_idx], confidence
     else:
         return "Unknown", 0.0
 
 
-def process_image(image_bytes: bytes, known_encs: Dict[str, np.ndarray]) -> Tuple[Image.Image, List[Tuple[Tuple[int, int, int, int], str, float]], Dict[str, Any], List[Image.Image]]:
+def process_image(image_bytes: bytes, known_encs: Gallery) -> Tuple[Image.Image, List[Tuple[Tuple[int, int, int, int], str, float]], Dict[str, Any], List[Image.Image]]:
     """Detect and recognize faces in an image.
 
     Returns annotated PIL image, list of results, a summary dict, and face thumbnails list.
@@ -182,7 +180,7 @@ def process_image(image_bytes: bytes, known_encs: Dict[str, np.ndarray]) -> Tupl
     return annotated, results, summary, thumbnails
 
 
-def process_video(video_bytes: bytes, known_encs: Dict[str, np.ndarray]) -> Tuple[List[Dict[str, Any]], List[Image.Image]]:
+def process_video(video_bytes: bytes, known_encs: Gallery) -> Tuple[List[Dict[str, Any]], List[Image.Image]]:
     """Process uploaded video, sample every 30th frame, detect and deduplicate faces, compare to known faces.
 
     Returns list of detections [{frame, location, name, confidence}] and preview thumbnails list.
@@ -315,7 +313,7 @@ def main():
         if not known_encs:
             st.warning("No known faces found. Add images to 'known_faces' to enable recognition.")
         else:
-            st.success(f"Loaded {len(known_encs)} known faces: {', '.join(known_encs.keys())}")
+            st.success(f"Loaded {len(known_encs)} known faces: {', '.join(known_encs.names)}")
             # Show thumbnails from folder
             try:
                 valid_exts = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
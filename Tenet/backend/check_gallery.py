@@ -0,0 +1,61 @@
+"""Self-check for Gallery storage modes against the float64 baseline.
+
+Uses gallery.synthetic() data, where every query has several of its own
+person's rows at almost the same distance, so quantization error has a real
+chance to reorder the top candidates. Each mode must return float64's best
+row (except for exact ties), the same distances and, in the compact modes,
+keep float64's best row among the re-ranked candidates. Needs only numpy:
+
+    python check_gallery.py
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from gallery import STORAGE_MODES, Gallery, synthetic
+
+N = 8000
+QUERIES = 400
+PHOTOS_PER_PERSON = 8
+RERANK = 16
+K = 3
+
+
+def main() -> None:
+    names, rows, q = synthetic(N, QUERIES, photos_per_person=PHOTOS_PER_PERSON, seed=7)
+    ref = Gallery(names, rows, mode='float64')
+    ref_idx, ref_dist = ref.search(q, k=K)
+    # Queries whose best two rows are closer than float32 resolution can
+    # legitimately swap; everything else must agree exactly
+    decided = (ref_dist[:, 1] - ref_dist[:, 0]) > 1e-6
+    margin = float(np.median(ref_dist[:, 1] - ref_dist[:, 0]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in STORAGE_MODES[1:]:
+            g = Gallery(names, rows, mode=mode, rerank=RERANK, exact_path=Path(tmp) / f'{mode}.npy')
+            idx, dist = g.search(q, k=K)
+            assert idx.shape == dist.shape == (QUERIES, K), (mode, idx.shape)
+            assert np.all(np.diff(dist, axis=1) >= 0), f"{mode}: results not sorted"
+            err = float(np.max(np.abs(dist - ref_dist)))
+            assert err < 1e-5, f"{mode}: distance error {err:.2e}"
+            wrong = int(np.sum(idx[decided, 0] != ref_idx[decided, 0]))
+            assert wrong == 0, f"{mode}: {wrong} queries picked a different best row"
+            assert [names[i] for i in idx[:, 0]] == [names[i] for i in ref_idx[:, 0]], mode
+
+            line = f"ok: {mode:<8} max |d - d64| {err:.1e}"
+            if mode in ('float16', 'int8'):
+                cand = g.first_pass(q, RERANK)
+                recall = float(np.mean([r in c for r, c in zip(ref_idx[:, 0], cand)]))
+                assert recall == 1.0, f"{mode}: recall@{RERANK} {recall:.3f}"
+                first = float(np.mean(cand[:, 0] == ref_idx[:, 0]))
+                line += f"  first-pass top1 {first:.1%} (re-rank fixes the rest)"
+            print(line)
+            del g
+    print(f"   {QUERIES} queries, median top-2 margin {margin:.3f}, "
+          f"{int(np.sum(~decided))} exact ties excluded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Self-check for CostModel profile selection under a latency budget.
+
+Feeds the model synthetic timings (no face_recognition needed) and checks the
+degradation order, that unmeasured profiles are judged by their priors, and
+that a profile whose first sample was slow is eventually tried again. Needs
+only the standard library:
+
+    python check_profiles.py
+"""
+
+from profiles import PROFILES, CostModel
+
+HD = (1080, 1920, 3)
+HD_MP = 1080 * 1920 / 1e6
+
+
+def check_degradation_order() -> None:
+    model = CostModel()
+    forensic = PROFILES['forensic']
+    # Priors: forensic ~8.9s, balanced ~2.1s, realtime ~0.1s on a 1080p frame
+    assert model.choose(forensic, HD, None).name == 'forensic'
+    assert model.choose(forensic, HD, 20.0).name == 'forensic'
+    assert model.choose(forensic, HD, 5.0).name == 'balanced'
+    assert model.choose(forensic, HD, 0.5).name == 'realtime'
+    # Never upgrades past the requested profile, and falls back to the cheapest
+    assert model.choose(PROFILES['balanced'], HD, 20.0).name == 'balanced'
+    assert model.choose(forensic, HD, 0.001).name == 'realtime'
+    print("ok: forensic -> balanced -> realtime as the budget shrinks")
+
+
+def check_unmeasured_prior() -> None:
+    model = CostModel()
+    assert not model.snapshot()['forensic']['measured']
+    assert model.choose(PROFILES['forensic'], HD, 0.1).name == 'realtime'
+    print("ok: unmeasured forensic with a 100 ms budget degrades to realtime")
+
+
+def check_slow_first_sample() -> None:
+    model = CostModel()
+    balanced = PROFILES['balanced']
+    # One cold-start call (model load, page faults) ten times slower than usual
+    model.observe(balanced, HD, 5.0 * HD_MP, 2, 0.06)
+    assert model.choose(balanced, HD, 2.5).name == 'realtime'
+
+    for tries in range(1, 200):
+        if model.choose(balanced, HD, 2.5).name == 'balanced':
+            break
+    else:
+        raise AssertionError(f"balanced never retried: {model.snapshot()['balanced']}")
+
+    # Once re-measured at its usual speed it stays selected
+    for _ in range(5):
+        model.observe(balanced, HD, 0.5 * HD_MP, 2, 0.06)
+    assert model.choose(balanced, HD, 2.5).name == 'balanced'
+    print(f"ok: balanced retried after {tries} skips following a slow first sample")
+
+
+def main() -> None:
+    check_degradation_order()
+    check_unmeasured_prior()
+    check_slow_first_sample()
+
+
+if __name__ == '__main__':
+    main()
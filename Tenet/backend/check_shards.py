@@ -0,0 +1,125 @@
+"""Self-check for ShardPool scatter-gather against stub shard processes.
+
+Starts a few local processes that answer /api/match-encodings and
+/api/known-encodings like a shard would (one fast, one fast with different
+names, one slower than the timeout, one returning a malformed body) and checks
+the merged top-k ordering, the failed-shard reporting and that calls without
+the shared secret are refused. Needs only numpy and requests:
+
+    python check_shards.py
+"""
+
+import json
+import multiprocessing as mp
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import numpy as np
+
+from shards import ShardPool, shard_of
+
+TIMEOUT = 1.0
+SECRET = 'check-secret'
+
+
+def _serve(port: int, hits: List[Tuple[str, float]], delay: float, malformed: bool) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(delay)
+            if self.headers.get('X-Shard-Secret') != SECRET:
+                self.send_response(403)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if self.path == '/api/known-encodings':
+                found = [[0.1] * 128 for n, _ in hits if n == body['name']]
+                out = {'success': True, 'encodings': found}
+            else:
+                results = [[{'name': n, 'distance': d} for n, d in sorted(hits, key=lambda h: h[1])[:body['k']]]
+                           for _ in body['encodings']]
+                if malformed:
+                    results = results[:-1]
+                out = {'success': True, 'results': results}
+            data = json.dumps(out).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    ThreadingHTTPServer(('127.0.0.1', port), Handler).serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_listening(port: int) -> None:
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"stub shard on port {port} did not start")
+
+
+def main() -> None:
+    stubs = [
+        ([('alice', 0.42), ('bob', 0.20), ('carol', 0.55)], 0.0, False),
+        ([('dave', 0.30), ('erin', 0.10)], 0.0, False),
+        ([('zed', 0.01)], TIMEOUT * 3, False),   # too slow, its better hit must be dropped
+        ([('yan', 0.02)], 0.0, True),            # wrong number of result lists
+    ]
+    procs, urls = [], []
+    for hits, delay, malformed in stubs:
+        port = _free_port()
+        p = mp.Process(target=_serve, args=(port, hits, delay, malformed), daemon=True)
+        p.start()
+        _wait_listening(port)
+        procs.append(p)
+        urls.append(f'http://127.0.0.1:{port}')
+    down = f'http://127.0.0.1:{_free_port()}'
+
+    try:
+        pool = ShardPool(urls + [down], timeout=TIMEOUT, secret=SECRET)
+        queries = [np.zeros(128), np.ones(128)]
+
+        started = time.perf_counter()
+        merged, failed = pool.match(queries, k=3)
+        elapsed = time.perf_counter() - started
+
+        expected = [('erin', 0.10), ('bob', 0.20), ('dave', 0.30)]
+        assert merged == [expected, expected], merged
+        assert sorted(failed) == sorted([urls[2], urls[3], down]), failed
+        assert elapsed < TIMEOUT * 2, f"slow shard held the merge for {elapsed:.2f}s"
+
+        merged, _ = pool.match(queries[:1], k=10)
+        dists = [d for _, d in merged[0]]
+        assert dists == sorted(dists) and len(dists) == 5, merged
+
+        encs, failed = pool.encodings_for('dave')
+        assert len(encs) == 1 and urls[2] in failed and down in failed, (len(encs), failed)
+
+        # A coordinator with the wrong secret gets nothing back
+        _, failed = ShardPool(urls[:2], timeout=TIMEOUT, secret='wrong').match(queries, k=1)
+        assert sorted(failed) == sorted(urls[:2]), failed
+
+        assert {shard_of(f'person{i}', 3) for i in range(50)} == {0, 1, 2}
+        print(f"ok: merged top-k and partial results across {len(urls) + 1} shards "
+              f"(match took {elapsed:.2f}s with a {TIMEOUT:.1f}s timeout)")
+    finally:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
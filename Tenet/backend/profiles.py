@@ -0,0 +1,148 @@
+"""Named recognition profiles and deadline-driven degradation.
+
+A profile fixes how much work detection and encoding may do:
+- model      face_locations detector ('hog', or 'cnn': more accurate, very slow without CUDA)
+- upsample   face_locations number_of_times_to_upsample (finds smaller faces, ~4x cost each)
+- max_side   longest image side fed to the detector, None for full resolution
+- jitters    face_encodings num_jitters (re-samples per face, linear cost)
+- max_faces  largest faces kept per image/frame, None for all
+
+`balanced` matches the face_recognition library defaults. When a request
+carries a latency budget, CostModel picks the most accurate profile (starting
+at the requested one) whose estimated cost fits, stepping down otherwise.
+"""
+
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+class Profile(NamedTuple):
+    name: str
+    model: str
+    upsample: int
+    max_side: Optional[int]
+    jitters: int
+    max_faces: Optional[int]
+
+
+PROFILES: Dict[str, Profile] = {
+    'realtime': Profile('realtime', 'hog', 0, 480, 1, 3),
+    'balanced': Profile('balanced', 'hog', 1, None, 1, None),
+    'forensic': Profile('forensic', 'hog', 2, None, 10, None),
+}
+# Most to least expensive; degradation walks down this list
+DEGRADE_ORDER = ('forensic', 'balanced', 'realtime')
+
+
+def detection_scale(profile: Profile, shape: Tuple[int, ...]) -> float:
+    """Factor to resize an image of this shape by before detection (<= 1)."""
+    longest = max(shape[0], shape[1])
+    if profile.max_side is None or longest <= profile.max_side:
+        return 1.0
+    return profile.max_side / float(longest)
+
+
+# Conservative starting costs per profile, used until a profile has been
+# measured: (detection seconds per detector megapixel, encoding seconds per face).
+# Deliberately pessimistic so an unmeasured profile never blows a tight budget.
+COST_PRIORS: Dict[str, Tuple[float, float]] = {
+    'realtime': (0.25, 0.03),
+    'balanced': (1.0, 0.03),
+    'forensic': (4.0, 0.3),
+}
+# Faces per image assumed until the first observation
+PRIOR_FACES = 2.0
+
+
+class CostModel:
+    """Per-profile cost estimates learned from requests.
+
+    A call is modelled as detection (seconds per detector megapixel) plus
+    encoding (seconds per face, which already includes the profile's jitters),
+    with the expected face count also tracked per profile and capped by
+    max_faces. Each term is an EWMA that starts from COST_PRIORS.
+
+    A profile is only re-measured when it gets chosen, so one slow sample could
+    otherwise keep it excluded forever. Each time a measured profile is skipped
+    for a deadline its estimate decays towards the cheaper of its prior and the
+    cheapest cost it has ever been observed at, which eventually lets it be
+    tried (and re-measured) again even if its only sample so far was slow.
+    """
+
+    def __init__(self, alpha: float = 0.2, decay: float = 0.9):
+        self.alpha = alpha
+        self.decay = decay
+        self._detect = {n: p[0] for n, p in COST_PRIORS.items()}
+        self._encode = {n: p[1] for n, p in COST_PRIORS.items()}
+        self._faces = {n: PRIOR_FACES for n in COST_PRIORS}
+        self._floor: Dict[str, Tuple[float, float]] = {}  # only for measured profiles
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _megapixels(profile: Profile, shape: Tuple[int, ...]) -> float:
+        s = detection_scale(profile, shape)
+        return max(1e-3, shape[0] * shape[1] * s * s / 1e6)
+
+    def _ewma(self, table: Dict[str, float], name: str, value: float) -> float:
+        if name not in self._floor:
+            table[name] = value  # first measurement replaces the prior
+        else:
+            table[name] += self.alpha * (value - table[name])
+        return table[name]
+
+    def observe(self, profile: Profile, shape: Tuple[int, ...], detect_seconds: float,
+                faces: int, encode_seconds: float) -> None:
+        det_rate = detect_seconds / self._megapixels(profile, shape)
+        with self._lock:
+            name = profile.name
+            self._ewma(self._detect, name, det_rate)
+            if faces:
+                self._ewma(self._encode, name, encode_seconds / faces)
+            self._ewma(self._faces, name, float(faces))
+            floor_det, floor_enc = self._floor.get(name, (det_rate, self._encode[name]))
+            self._floor[name] = (min(floor_det, det_rate),
+                                 min(floor_enc, encode_seconds / faces) if faces else floor_enc)
+
+    def estimate(self, profile: Profile, shape: Tuple[int, ...]) -> float:
+        with self._lock:
+            name = profile.name
+            faces = self._faces[name]
+            if profile.max_faces is not None:
+                faces = min(faces, profile.max_faces)
+            return self._detect[name] * self._megapixels(profile, shape) + self._encode[name] * faces
+
+    def _relax(self, name: str) -> None:
+        with self._lock:
+            if name not in self._floor:
+                return
+            floor_det, floor_enc = self._floor[name]
+            # A slow first sample sets the floor too, so never rest above the prior
+            floor_det = min(floor_det, COST_PRIORS[name][0])
+            floor_enc = min(floor_enc, COST_PRIORS[name][1])
+            self._detect[name] = max(floor_det, self._detect[name] * self.decay)
+            self._encode[name] = max(floor_enc, self._encode[name] * self.decay)
+
+    def choose(self, requested: Profile, shape: Tuple[int, ...],
+               budget: Optional[float]) -> Profile:
+        """Most accurate profile, no better than requested, expected to fit
+        budget seconds; the cheapest profile if none does."""
+        if budget is None:
+            return requested
+        start = DEGRADE_ORDER.index(requested.name)
+        chosen = DEGRADE_ORDER[-1]
+        for name in DEGRADE_ORDER[start:]:
+            if self.estimate(PROFILES[name], shape) <= budget:
+                chosen = name
+                break
+        for skipped in DEGRADE_ORDER[start:DEGRADE_ORDER.index(chosen)]:
+            self._relax(skipped)
+        return PROFILES[chosen]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {n: {
+                'detect_s_per_mp': self._detect[n],
+                'encode_s_per_face': self._encode[n],
+                'faces': self._faces[n],
+                'measured': n in self._floor,
+            } for n in COST_PRIORS}
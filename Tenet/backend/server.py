@@ -1,16 +1,26 @@
+import atexit
 import base64
+import hmac
 import io
+import math
 import os
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import tempfile
+import time
+import uuid
 
 import numpy as np
 from PIL import Image
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, send_file, url_for
 from flask_cors import CORS
 
+from gallery import Gallery
+from profiles import DEGRADE_ORDER, PROFILES, CostModel, Profile, detection_scale
+from shards import ShardPool, shard_of
+from sightings import SightingsStore
+
 try:
     import face_recognition  # type: ignore
 except Exception as e:
@@ -37,12 +47,55 @@ SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY') or os.getenv('SBase_Anon_key'
 SUPABASE_BUCKET = os.getenv('SUPABASE_BUCKET', 'faces')
 SUPABASE_ENABLED = bool(SUPABASE_URL and SUPABASE_ANON_KEY)
 
-KNOWN_ENCODINGS: List[np.ndarray] = []
-KNOWN_NAMES: List[str] = []
+# Gallery storage: float64 (default), float32, or compact float16/int8 with
+# exact re-ranking of the top GALLERY_RERANK candidates
+GALLERY_STORAGE = os.getenv('GALLERY_STORAGE', 'float64')
+GALLERY_RERANK = int(os.getenv('GALLERY_RERANK', '32'))
+
+# Sharding: a shard (SHARD_INDEX of SHARD_COUNT) loads only the names in its
+# partition; a coordinator (SHARD_URLS set) holds no gallery and fans matches
+# out to the shards instead
+SHARD_INDEX = int(os.getenv('SHARD_INDEX', '0'))
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '1'))
+SHARD_URLS = [u for u in os.getenv('SHARD_URLS', '').split(',') if u.strip()]
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', '2.0'))
+# Shared secret for the shard-to-shard endpoints, which expose raw encodings
+SHARD_SECRET = os.getenv('SHARD_SECRET', '')
+if SHARD_COUNT < 1 or not 0 <= SHARD_INDEX < SHARD_COUNT:
+    # A shard outside its partition range would load nothing and silently miss
+    raise RuntimeError(f"SHARD_INDEX must be in [0, SHARD_COUNT), got {SHARD_INDEX} of {SHARD_COUNT}")
+if (SHARD_URLS or SHARD_COUNT > 1) and not SHARD_SECRET:
+    raise RuntimeError("SHARD_SECRET must be set on shards and the coordinator")
+SHARDS = ShardPool(SHARD_URLS, timeout=SHARD_TIMEOUT, secret=SHARD_SECRET) if SHARD_URLS else None
+# Re-encoding a shard's gallery takes far longer than a match
+SHARD_RELOAD_TIMEOUT = float(os.getenv('SHARD_RELOAD_TIMEOUT', '300'))
+
+# Learned per-profile detection cost, used to honour request deadlines
+COSTS = CostModel()
 
 # A small cache dir under Tenet backend for downloaded Supabase faces
 CACHE_DIR = BASE_DIR / '.faces-cache'
 CACHE_DIR.mkdir(exist_ok=True)
+# Shards started from the same directory each keep their own download copy
+BUCKET_DIR = CACHE_DIR / (f"{SUPABASE_BUCKET}-shard{SHARD_INDEX}" if SHARD_COUNT > 1 else SUPABASE_BUCKET)
+
+
+def _owns(name: str) -> bool:
+    """Whether this process's gallery partition includes name."""
+    return SHARD_COUNT <= 1 or shard_of(name, SHARD_COUNT) == SHARD_INDEX
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Readers never see a half-written image
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+# Every face seen in processed uploads is kept here so newly registered people
+# can be searched for retroactively without reprocessing the footage
+SIGHTINGS_DIR = Path(os.getenv('SIGHTINGS_DIR') or (BASE_DIR / '.sightings'))
+SIGHTINGS = SightingsStore(SIGHTINGS_DIR)
 
 def _fetch_supabase_faces() -> None:
     """Download images from Supabase Storage bucket into CACHE_DIR/faces and
@@ -64,7 +117,7 @@ def _fetch_supabase_faces() -> None:
         resp.raise_for_status()
         items = resp.json() if isinstance(resp.json(), list) else []
 
-        bucket_dir = CACHE_DIR / SUPABASE_BUCKET
+        bucket_dir = BUCKET_DIR
         bucket_dir.mkdir(parents=True, exist_ok=True)
 
         for it in items:
@@ -75,24 +128,24 @@ def _fetch_supabase_faces() -> None:
             ext = os.path.splitext(name)[1].lower()
             if ext not in {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}:
                 continue
+            # Only download this shard's partition
+            out_path = bucket_dir / name.replace('/', '_')
+            if not _owns(os.path.splitext(out_path.name)[0]):
+                continue
 
             # Prefer private fetch: /storage/v1/object/{bucket}/{path}
             obj_url = f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{name}"
             try:
                 r = requests.get(obj_url, headers=headers, timeout=20)
                 r.raise_for_status()
-                out_path = bucket_dir / name.replace('/', '_')
-                with open(out_path, 'wb') as f:
-                    f.write(r.content)
+                _write_atomic(out_path, r.content)
             except Exception:
                 # Fallback to public path if bucket is public
                 try:
                     public_url = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{name}"
                     r = requests.get(public_url, headers={'apikey': SUPABASE_ANON_KEY}, timeout=20)
                     r.raise_for_status()
-                    out_path = bucket_dir / name.replace('/', '_')
-                    with open(out_path, 'wb') as f:
-                        f.write(r.content)
+                    _write_atomic(out_path, r.content)
                 except Exception:
                     continue
     except Exception:
@@ -114,9 +167,8 @@ def load_known_faces() -> Tuple[List[str], List[np.ndarray]]:
     dirs = []
     if KNOWN_DIR.is_dir():
         dirs.append(KNOWN_DIR)
-    bucket_dir = CACHE_DIR / SUPABASE_BUCKET
-    if bucket_dir.is_dir():
-        dirs.append(bucket_dir)
+    if BUCKET_DIR.is_dir():
+        dirs.append(BUCKET_DIR)
 
     for d in dirs:
         for fname in os.listdir(d):
@@ -126,6 +178,8 @@ def load_known_faces() -> Tuple[List[str], List[np.ndarray]]:
             name, ext = os.path.splitext(fname)
             if ext.lower() not in {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}:
                 continue
+            if not _owns(name):
+                continue
             try:
                 image = face_recognition.load_image_file(str(fpath))
                 encs = face_recognition.face_encodings(image)
@@ -139,7 +193,76 @@ def load_known_faces() -> Tuple[List[str], List[np.ndarray]]:
     return names, encodings
 
 
-KNOWN_NAMES, KNOWN_ENCODINGS = load_known_faces()
+# Memory-mapped exact-row files written by this process, oldest first
+_GALLERY_FILES: List[Path] = []
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill(pid, 0) terminates the process on Windows; there, a live
+        # owner's file is still mapped and the unlink below simply fails
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_stale_gallery_files() -> None:
+    """Delete gallery files left by processes that are no longer running."""
+    for path in CACHE_DIR.glob('gallery-*.npy'):
+        try:
+            pid = int(path.name.split('-')[1])
+        except (IndexError, ValueError):
+            pid = None
+        if pid == os.getpid() or (pid is not None and _pid_alive(pid)):
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+@atexit.register
+def _remove_own_gallery_files() -> None:
+    for path in _GALLERY_FILES:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def build_gallery() -> Gallery:
+    if SHARDS is not None:
+        return Gallery([], [])
+    names, encodings = load_known_faces()
+    # Exact rows for re-ranking are memory-mapped; a fresh file per build keeps
+    # an in-flight search on the previous gallery valid during /api/reload. The
+    # pid keeps processes sharing CACHE_DIR (e.g. local shards) off each other's files
+    exact_path = CACHE_DIR / f"gallery-{os.getpid()}-{uuid.uuid4().hex[:8]}.npy"
+    gallery = Gallery(names, encodings, mode=GALLERY_STORAGE,
+                      rerank=GALLERY_RERANK, exact_path=exact_path)
+    # Windows refuses to unlink a file that is still mapped; keep those and
+    # retry on the next reload
+    still_open = []
+    for old in _GALLERY_FILES:
+        try:
+            old.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError:
+            still_open.append(old)
+    _GALLERY_FILES[:] = still_open
+    if exact_path.exists():
+        _GALLERY_FILES.append(exact_path)
+    return gallery
+
+
+_remove_stale_gallery_files()
+GALLERY = build_gallery()
 
 
 def _b64_to_image(data_url: str) -> np.ndarray:
@@ -153,31 +276,157 @@ def _b64_to_image(data_url: str) -> np.ndarray:
     return np.array(img)
 
 
-def _match(encoding: np.ndarray) -> Tuple[bool, str, float]:
-    if not KNOWN_ENCODINGS:
-        return False, "", 0.0
-    encs = np.stack(KNOWN_ENCODINGS)
-    matches = face_recognition.compare_faces(encs, encoding, tolerance=TOLERANCE)
-    distances = face_recognition.face_distance(encs, encoding)
-    if len(distances) == 0:
-        return False, "", 0.0
-    best_idx = int(np.argmin(distances))
-    best_dist = float(distances[best_idx])
-    if matches[best_idx] and best_dist < TOLERANCE:
-        # Confidence heuristic similar to frontend
-        conf = max(0.0, 1.0 - best_dist / TOLERANCE)
-        confidence = 60.0 + conf * 40.0
-        return True, KNOWN_NAMES[best_idx], confidence
-    return False, "", 0.0
+def _confidence(dist: float) -> float:
+    # Confidence heuristic similar to frontend
+    conf = max(0.0, 1.0 - dist / TOLERANCE)
+    return 60.0 + conf * 40.0
+
+
+def _crop(rgb: np.ndarray, loc: Tuple[int, int, int, int], pad: int) -> np.ndarray:
+    top, right, bottom, left = loc
+    t = max(0, top - pad)
+    b = min(rgb.shape[0], bottom + pad)
+    l = max(0, left - pad)
+    r = min(rgb.shape[1], right + pad)
+    return rgb[t:b, l:r]
+
+
+def _jpeg_data_url(pil_img: Image.Image) -> str:
+    buf = io.BytesIO()
+    pil_img.save(buf, format='JPEG')
+    return 'data:image/jpeg;base64,' + base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def _profile_request(default: str) -> Tuple[Profile, Optional[float]]:
+    """Profile and latency budget (seconds) for this request, from 'profile' and
+    'deadline_ms' in the JSON body, form or query string, or an X-Deadline-Ms header."""
+    data = request.get_json(silent=True) or {}
+
+    def param(key: str, header: Optional[str] = None):
+        # Presence, not truthiness: deadline_ms=0 must be rejected, not ignored
+        for value in (data.get(key), request.values.get(key),
+                      request.headers.get(header) if header else None):
+            if value is not None and value != '':
+                return value
+        return None
+
+    name = param('profile') or default
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile '{name}', expected one of: {', '.join(PROFILES)}")
+    deadline = param('deadline_ms', 'X-Deadline-Ms')
+    if deadline is None:
+        return PROFILES[name], None
+    try:
+        budget = float(deadline) / 1000.0
+    except (TypeError, ValueError):
+        raise ValueError('deadline_ms must be a number')
+    if not math.isfinite(budget) or budget <= 0:
+        raise ValueError('deadline_ms must be a positive finite number')
+    return PROFILES[name], budget
+
+
+def _detect(rgb: np.ndarray, profile: Profile) -> Tuple[List[Tuple[int, int, int, int]], List[np.ndarray]]:
+    """Face locations (in rgb's coordinates) and encodings under a profile."""
+    started = time.perf_counter()
+    h, w = rgb.shape[:2]
+    scale = detection_scale(profile, rgb.shape)
+    small = rgb
+    if scale < 1.0:
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        small = np.array(Image.fromarray(rgb).resize(size, Image.BILINEAR))
+
+    locations = face_recognition.face_locations(
+        small, number_of_times_to_upsample=profile.upsample, model=profile.model)
+    if profile.max_faces is not None and len(locations) > profile.max_faces:
+        # Keep the largest faces; far-away ones are the least likely to match anyway
+        locations = sorted(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]),
+                           reverse=True)[:profile.max_faces]
+    detected = time.perf_counter()
+    encodings = face_recognition.face_encodings(small, locations, num_jitters=profile.jitters)
+    encoded = time.perf_counter()
+
+    if scale < 1.0:
+        locations = [
+            (max(0, int(t / scale)), min(w, int(r / scale)),
+             min(h, int(b / scale)), max(0, int(l / scale)))
+            for t, r, b, l in locations
+        ]
+    COSTS.observe(profile, rgb.shape, detected - started, len(locations), encoded - detected)
+    return locations, encodings
+
+
+def _profile_report(requested: Profile, used: Dict[str, int], budget: Optional[float],
+                    started: float) -> Dict:
+    # Report the cheapest profile actually used so degradation is visible
+    used_names = [n for n in DEGRADE_ORDER if used.get(n)]
+    return {'profile': {
+        'requested': requested.name,
+        'used': used_names[-1] if used_names else requested.name,
+        'degraded': any(n != requested.name for n in used_names),
+        'deadline_ms': budget * 1000.0 if budget is not None else None,
+        'elapsed_ms': (time.perf_counter() - started) * 1000.0,
+    }}
+
+
+def _search(encodings: List[np.ndarray], k: int) -> Tuple[List[List[Tuple[str, float]]], List[str]]:
+    """Top-k (name, distance) per encoding from the local gallery or, on a
+    coordinator, merged across shards. Also returns shards that failed."""
+    if not encodings:
+        return [], []
+    if SHARDS is not None:
+        return SHARDS.match(encodings, k=k)
+    gallery = GALLERY
+    idx, dist = gallery.search(np.stack(encodings), k=k)
+    hits = [[(gallery.names[int(i)], float(d)) for i, d in zip(row_i, row_d)]
+            for row_i, row_d in zip(idx, dist)]
+    return hits, []
+
+
+def _match_all(encodings: List[np.ndarray]) -> Tuple[List[Tuple[bool, str, float]], List[str]]:
+    hits, failed = _search(encodings, k=1)
+    out = []
+    for h in hits:
+        if h and h[0][1] < TOLERANCE:
+            out.append((True, h[0][0], _confidence(h[0][1])))
+        else:
+            out.append((False, "", 0.0))
+    return out, failed
+
+
+def _shard_status(failed: List[str]) -> Dict:
+    if SHARDS is None:
+        return {}
+    failed = sorted(set(failed))
+    return {'shards': {'total': len(SHARDS), 'failed': failed, 'partial': bool(failed)}}
 
 
 @app.route('/api/health', methods=['GET'])
 def health():
+    shard_info = {'index': SHARD_INDEX, 'count': SHARD_COUNT}
+    known = len(GALLERY)
+    if SHARDS is not None:
+        bodies, failed = SHARDS.fanout('GET', '/api/health')
+        known = sum(int(b.get('known_faces', 0)) for b in bodies.values())
+        shard_info = {
+            'coordinator': True,
+            'nodes': {url: bodies[url].get('known_faces') if url in bodies else None
+                      for url in SHARDS.urls},
+            **_shard_status(failed)['shards'],
+        }
     return jsonify({
         'ok': True,
-        'known_faces': len(KNOWN_ENCODINGS),
+        'known_faces': known,
+        'shard': shard_info,
         'tolerance': TOLERANCE,
+        'gallery': {
+            'storage': GALLERY.mode,
+            'rerank': GALLERY.rerank,
+            'bytes': GALLERY.nbytes,
+        },
         'known_faces_dir': str(KNOWN_DIR),
+        'profiles': {name: p._asdict() for name, p in PROFILES.items()},
+        'profile_costs': COSTS.snapshot(),
+        'sightings': SIGHTINGS.stats(),
         'supabase': {
             'enabled': SUPABASE_ENABLED,
             'bucket': SUPABASE_BUCKET if SUPABASE_ENABLED else None
@@ -186,19 +435,31 @@ def health():
 
 @app.route('/api/reload', methods=['POST'])
 def reload_faces():
-    global KNOWN_NAMES, KNOWN_ENCODINGS
+    global GALLERY
     try:
-        KNOWN_NAMES, KNOWN_ENCODINGS = load_known_faces()
-        return jsonify({'ok': True, 'known_faces': len(KNOWN_ENCODINGS)})
+        if SHARDS is not None:
+            bodies, failed = SHARDS.fanout('POST', '/api/reload', timeout=SHARD_RELOAD_TIMEOUT)
+            known = sum(int(b.get('known_faces', 0)) for b in bodies.values())
+            # 207 when only some shards reloaded, 502 when none did
+            code = 200 if not failed else (207 if bodies else 502)
+            return jsonify({'ok': not failed, 'known_faces': known, **_shard_status(failed)}), code
+        GALLERY = build_gallery()
+        return jsonify({'ok': True, 'known_faces': len(GALLERY)})
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
 
 
 @app.route('/api/process-image', methods=['POST'])
 def process_image():
+    started = time.perf_counter()
     if face_recognition is None:
         return jsonify({'success': False, 'error': str(_fr_err)}), 500
 
+    try:
+        requested, budget = _profile_request('balanced')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
     if 'file' not in request.files:
         return jsonify({'success': False, 'error': 'No file uploaded'}), 400
     file = request.files['file']
@@ -208,43 +469,59 @@ def process_image():
     except Exception as e:
         return jsonify({'success': False, 'error': f'Invalid image: {e}'}), 400
 
-    locations = face_recognition.face_locations(rgb)
-    encodings = face_recognition.face_encodings(rgb, locations)
+    remaining = budget - (time.perf_counter() - started) if budget is not None else None
+    profile = COSTS.choose(requested, rgb.shape, remaining)
+    locations, encodings = _detect(rgb, profile)
 
+    source_id = SightingsStore.new_source_id()
+    results, failed = _match_all(encodings)
     matches_out = []
-    for loc, enc in zip(locations, encodings):
-        matched, name, conf = _match(enc)
-        if matched:
-            top, right, bottom, left = loc
-            # Extract thumbnail
-            pad = 10
-            t = max(0, top - pad)
-            b = min(rgb.shape[0], bottom + pad)
-            l = max(0, left - pad)
-            r = min(rgb.shape[1], right + pad)
-            thumb = rgb[t:b, l:r]
-            # Encode thumbnail to base64
-            pil_thumb = Image.fromarray(thumb)
-            buf = io.BytesIO()
-            pil_thumb.save(buf, format='JPEG')
-            thumb_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+    for loc, enc, (matched, name, conf) in zip(locations, encodings, results):
+        # Extract thumbnail
+        thumb = _crop(rgb, loc, 10)
+        SIGHTINGS.add(source_id, enc, loc, thumb=thumb, source_name=file.filename)
 
+        if matched:
             matches_out.append({
                 'name': name,
                 'confidence': conf,
-                'thumbnail': f'data:image/jpeg;base64,{thumb_b64}'
+                'thumbnail': _jpeg_data_url(Image.fromarray(thumb))
             })
 
+    status = {**_shard_status(failed), **_profile_report(requested, {profile.name: 1}, budget, started)}
     if not matches_out:
-        return jsonify({'success': True, 'matched': False, 'matches': []})
-    return jsonify({'success': True, 'matched': True, 'matches': matches_out})
+        return jsonify({'success': True, 'matched': False, 'matches': [], 'source_id': source_id, **status})
+    return jsonify({'success': True, 'matched': True, 'matches': matches_out, 'source_id': source_id, **status})
+
+
+def _samples_left(cap, frame_idx: int, samples_done: int) -> int:
+    """Sampled frames (every 30th) still to come in cap, counting the current one.
+
+    CAP_PROP_FRAME_COUNT is often 0 or wrong (it comes from container headers),
+    so a count we have already read past falls back to the relative read
+    position, and failing that to assuming as many again as sampled so far.
+    """
+    import cv2
+    total = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+    if total <= frame_idx:
+        ratio = cap.get(cv2.CAP_PROP_POS_AVI_RATIO) or 0.0
+        total = frame_idx / ratio if 0.0 < ratio < 1.0 else 0.0
+    if total > frame_idx:
+        return 1 + int(total - frame_idx) // 30
+    return max(2, samples_done + 1)
 
 
 @app.route('/api/process-video', methods=['POST'])
 def process_video():
+    started = time.perf_counter()
     if face_recognition is None:
         return jsonify({'success': False, 'error': str(_fr_err)}), 500
 
+    try:
+        requested, budget = _profile_request('balanced')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
     if 'file' not in request.files:
         return jsonify({'success': False, 'error': 'No file uploaded'}), 400
     file = request.files['file']
@@ -267,8 +544,13 @@ def process_video():
             os.unlink(path)
             return jsonify({'success': False, 'error': 'Cannot open video'}), 400
 
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        samples_done = 0
+        used: Dict[str, int] = {}
+        source_id = SightingsStore.new_source_id()
         unique_encs: List[np.ndarray] = []
         out_matches = []
+        failed_shards: List[str] = []
         frame_idx = 0
 
         while True:
@@ -279,10 +561,29 @@ def process_video():
             if frame_idx % 30 != 0:
                 continue
             rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            locations = face_recognition.face_locations(rgb)
-            encodings = face_recognition.face_encodings(rgb, locations)
-
+            frame_budget = None
+            if budget is not None:
+                # Spread the remaining budget over the sampled frames still to come
+                remaining = budget - (time.perf_counter() - started)
+                frame_budget = remaining / _samples_left(cap, frame_idx, samples_done)
+            profile = COSTS.choose(requested, rgb.shape, frame_budget)
+            used[profile.name] = used.get(profile.name, 0) + 1
+            samples_done += 1
+            locations, encodings = _detect(rgb, profile)
+
+            new_locs = []
+            new_encs: List[np.ndarray] = []
             for loc, enc in zip(locations, encodings):
+                # Record every sampled sighting, not just the first of each face,
+                # so later searches can place a person at each point in the video
+                SIGHTINGS.add(
+                    source_id, enc, loc,
+                    frame=frame_idx,
+                    timestamp=(frame_idx / fps) if fps > 0 else None,
+                    thumb=_crop(rgb, loc, 8),
+                    source_name=file.filename,
+                )
+
                 is_new = True
                 if unique_encs:
                     dists = face_recognition.face_distance(np.stack(unique_encs), enc)
@@ -291,26 +592,20 @@ def process_video():
                 if not is_new:
                     continue
                 unique_encs.append(enc)
+                new_locs.append(loc)
+                new_encs.append(enc)
 
-                matched, name, conf = _match(enc)
+            # One matching round trip per sampled frame
+            results, failed = _match_all(new_encs)
+            failed_shards.extend(failed)
+            for loc, (matched, name, conf) in zip(new_locs, results):
                 if matched:
-                    top, right, bottom, left = loc
-                    pad = 8
-                    t = max(0, top - pad)
-                    b = min(rgb.shape[0], bottom + pad)
-                    l = max(0, left - pad)
-                    r = min(rgb.shape[1], right + pad)
-                    thumb = rgb[t:b, l:r]
-                    pil_thumb = Image.fromarray(thumb)
-                    buf = io.BytesIO()
-                    pil_thumb.save(buf, format='JPEG')
-                    thumb_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-
+                    thumb = _crop(rgb, loc, 8)
                     out_matches.append({
                         'frame': frame_idx,
                         'name': name,
                         'confidence': conf,
-                        'thumbnail': f'data:image/jpeg;base64,{thumb_b64}'
+                        'thumbnail': _jpeg_data_url(Image.fromarray(thumb))
                     })
         cap.release()
     finally:
@@ -319,16 +614,25 @@ def process_video():
         except Exception:
             pass
 
+    report = _profile_report(requested, used, budget, started)
+    report['profile']['frames_by_profile'] = used
+    status = {**_shard_status(failed_shards), **report}
     if not out_matches:
-        return jsonify({'success': True, 'matched': False, 'matches': []})
-    return jsonify({'success': True, 'matched': True, 'matches': out_matches})
+        return jsonify({'success': True, 'matched': False, 'matches': [], 'source_id': source_id, **status})
+    return jsonify({'success': True, 'matched': True, 'matches': out_matches, 'source_id': source_id, **status})
 
 
 @app.route('/api/process-frame', methods=['POST'])
 def process_frame():
+    started = time.perf_counter()
     if face_recognition is None:
         return jsonify({'success': False, 'error': str(_fr_err)}), 500
 
+    try:
+        requested, budget = _profile_request('balanced')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
     data = request.get_json(silent=True) or {}
     frame_data = data.get('frame')
     if not frame_data:
@@ -339,11 +643,13 @@ def process_frame():
     except Exception as e:
         return jsonify({'success': False, 'error': f'Invalid frame: {e}'}), 400
 
-    locations = face_recognition.face_locations(rgb)
-    encodings = face_recognition.face_encodings(rgb, locations)
+    remaining = budget - (time.perf_counter() - started) if budget is not None else None
+    profile = COSTS.choose(requested, rgb.shape, remaining)
+    _, encodings = _detect(rgb, profile)
 
-    for loc, enc in zip(locations, encodings):
-        matched, name, conf = _match(enc)
+    results, failed = _match_all(encodings)
+    status = {**_shard_status(failed), **_profile_report(requested, {profile.name: 1}, budget, started)}
+    for matched, name, conf in results:
         if matched:
             # Build response with timestamp
             return jsonify({
@@ -353,10 +659,137 @@ def process_frame():
                     'name': name,
                     'confidence': conf,
                     'timestamp': datetime.utcnow().isoformat() + 'Z'
-                }
+                },
+                **status
             })
 
-    return jsonify({'success': True, 'matched': False})
+    return jsonify({'success': True, 'matched': False, **status})
+
+
+def _shard_authorized() -> bool:
+    # Internal shard endpoints stay closed unless SHARD_SECRET is configured
+    supplied = request.headers.get('X-Shard-Secret', '')
+    return bool(SHARD_SECRET) and hmac.compare_digest(supplied, SHARD_SECRET)
+
+
+@app.route('/api/match-encodings', methods=['POST'])
+def match_encodings():
+    """Top-k gallery matches for precomputed encodings.
+
+    This is what a coordinator calls on each shard (and on a coordinator it
+    fans out in turn). Requires the X-Shard-Secret header.
+    """
+    if not _shard_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        encodings = [np.asarray(e, dtype=np.float64).reshape(128) for e in data.get('encodings', [])]
+        k = max(1, int(data.get('k', 1)))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid encodings: {e}'}), 400
+
+    hits, failed = _search(encodings, k)
+    return jsonify({
+        'success': True,
+        'shard': SHARD_INDEX,
+        'results': [[{'name': n, 'distance': d} for n, d in h] for h in hits],
+        **_shard_status(failed)
+    })
+
+
+@app.route('/api/known-encodings', methods=['POST'])
+def known_encodings():
+    if not _shard_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'success': False, 'error': 'Missing name'}), 400
+    failed: List[str] = []
+    if SHARDS is not None:
+        encs, failed = SHARDS.encodings_for(name)
+    else:
+        encs = GALLERY.encodings_for(name)
+    return jsonify({'success': True, 'encodings': [e.tolist() for e in encs], **_shard_status(failed)})
+
+
+@app.route('/api/sightings/search', methods=['POST'])
+def search_sightings():
+    """Search previously processed footage for a person.
+
+    Either upload a reference photo as 'file', or pass 'name' to search for a
+    person already in the known faces gallery. Optional 'tolerance', 'limit'
+    and 'profile' (used to encode the reference photo).
+    """
+    if face_recognition is None:
+        return jsonify({'success': False, 'error': str(_fr_err)}), 500
+
+    params = request.get_json(silent=True) or request.form
+    try:
+        tolerance = float(params.get('tolerance', TOLERANCE))
+        limit = int(params.get('limit', 50))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid tolerance or limit'}), 400
+    if limit < 0:
+        return jsonify({'success': False, 'error': 'limit must not be negative'}), 400
+    try:
+        profile, _ = _profile_request('balanced')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    failed: List[str] = []
+    if 'file' in request.files:
+        try:
+            img = Image.open(request.files['file'].stream).convert('RGB')
+            rgb = np.array(img)
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'Invalid image: {e}'}), 400
+        locations, encodings = _detect(rgb, profile)
+        if not encodings:
+            return jsonify({'success': False, 'error': 'No face found in reference image'}), 400
+        # Use the most prominent face in the reference photo
+        areas = [(b - t) * (r - l) for t, r, b, l in locations]
+        queries = [encodings[int(np.argmax(areas))]]
+    elif params.get('name'):
+        name = params.get('name')
+        if SHARDS is not None:
+            queries, failed = SHARDS.encodings_for(name)
+        else:
+            queries = GALLERY.encodings_for(name)
+        if not queries and failed:
+            # The shard owning this name may be the one that did not answer
+            return jsonify({'success': False, 'error': f'Could not look up {name}: shards unavailable',
+                            **_shard_status(failed)}), 503
+        if not queries:
+            return jsonify({'success': False, 'error': f'Unknown person: {name}'}), 404
+    else:
+        return jsonify({'success': False, 'error': 'Provide a reference file or a name'}), 400
+
+    hits = SIGHTINGS.search(np.stack(queries), tolerance, limit)
+    out = []
+    for h in hits:
+        ref = h.get('thumbnail')
+        out.append({
+            'source_id': h['source_id'],
+            'source_name': h.get('source_name'),
+            'frame': h.get('frame'),
+            'timestamp': h.get('timestamp'),
+            'box': h['box'],
+            'distance': h['distance'],
+            'confidence': _confidence(h['distance']),
+            # Served on demand by sighting_thumbnail rather than inlined per hit
+            'thumbnail': url_for('sighting_thumbnail', ref=ref) if ref else None,
+        })
+    return jsonify({'success': True, 'matched': bool(out), 'matches': out, 'searched': len(SIGHTINGS),
+                    **_shard_status(failed)})
+
+
+@app.route('/api/sightings/thumbnail/<path:ref>', methods=['GET'])
+def sighting_thumbnail(ref: str):
+    path = SIGHTINGS.thumbnail_path(ref)
+    if path is None:
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    return send_file(str(path), mimetype='image/jpeg')
 
 
 if __name__ == '__main__':
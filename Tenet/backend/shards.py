@@ -0,0 +1,105 @@
+"""Scatter-gather matching across sharded Tenet backends.
+
+Each shard is a normal server.py process started with SHARD_INDEX/SHARD_COUNT,
+so it only loads the known faces whose name hashes to its partition. A
+coordinator (started with SHARD_URLS) sends a query's encodings to every
+shard's /api/match-encodings concurrently and merges the per-shard top-k.
+
+A shard that errors or misses the per-shard timeout is reported back as
+failed and the merge carries on with whatever the other shards returned.
+
+Every call carries the shared SHARD_SECRET in an X-Shard-Secret header, since
+the shard endpoints return raw face encodings.
+"""
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def shard_of(name: str, shard_count: int) -> int:
+    """Stable partition for a gallery name (Python's hash() is salted per process)."""
+    return zlib.crc32(name.encode('utf-8')) % shard_count
+
+
+class ShardPool:
+    def __init__(self, urls: Sequence[str], timeout: float = 2.0, pool_size: int = 8,
+                 secret: str = ''):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.urls = [u.rstrip('/') for u in urls if u.strip()]
+        self.timeout = timeout
+        # One keep-alive session per shard so connections are reused across requests
+        self._sessions = {}
+        for url in self.urls:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['X-Shard-Secret'] = secret
+            self._sessions[url] = session
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.urls) * pool_size),
+                                            thread_name_prefix='shard')
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def _call(self, url: str, method: str, path: str, payload: Optional[Dict[str, Any]],
+              timeout: float) -> Any:
+        resp = self._sessions[url].request(method, url + path, json=payload, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def fanout(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> Tuple[Dict[str, Any], List[str]]:
+        """Call path on every shard concurrently, waiting at most timeout
+        (default: the pool's per-shard timeout).
+
+        Returns ({url: json_body} for shards that answered in time, [failed urls]).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        futures = {self._executor.submit(self._call, url, method, path, payload, timeout): url
+                   for url in self.urls}
+        done, _ = wait(futures, timeout=timeout)
+        ok: Dict[str, Any] = {}
+        failed: List[str] = []
+        for fut, url in futures.items():
+            if fut in done and fut.exception() is None:
+                ok[url] = fut.result()
+            else:
+                # Stragglers keep running in the pool but are ignored here
+                fut.cancel()
+                failed.append(url)
+        return ok, failed
+
+    def match(self, encodings: Sequence[np.ndarray],
+              k: int = 1) -> Tuple[List[List[Tuple[str, float]]], List[str]]:
+        """Merged top-k (name, distance) per query across all shards."""
+        payload = {
+            'encodings': [np.asarray(e, dtype=np.float64).tolist() for e in encodings],
+            'k': k,
+        }
+        bodies, failed = self.fanout('POST', '/api/match-encodings', payload)
+        merged: List[List[Tuple[str, float]]] = [[] for _ in encodings]
+        for url, body in bodies.items():
+            results = body.get('results') if isinstance(body, dict) else None
+            if not isinstance(results, list) or len(results) != len(encodings):
+                failed.append(url)
+                continue
+            for i, hits in enumerate(results):
+                merged[i].extend((h['name'], float(h['distance'])) for h in hits)
+        for i, hits in enumerate(merged):
+            hits.sort(key=lambda h: h[1])
+            merged[i] = hits[:k]
+        return merged, failed
+
+    def encodings_for(self, name: str) -> Tuple[List[np.ndarray], List[str]]:
+        bodies, failed = self.fanout('POST', '/api/known-encodings', {'name': name})
+        encs: List[np.ndarray] = []
+        for body in bodies.values():
+            for e in body.get('encodings', []):
+                encs.append(np.asarray(e, dtype=np.float64))
+        return encs, failed
@@ -0,0 +1,228 @@
+"""Append-only store of every face seen in processed footage.
+
+Each sighting keeps its 128-d encoding plus where it came from (source id,
+frame / timestamp, bounding box and a thumbnail on disk), so a person that is
+registered later can be searched for retroactively without re-decoding the
+original uploads.
+
+On-disk layout under the store root:
+- encodings.f32   raw float32 rows, one 128-d encoding per sighting
+- sightings.jsonl one JSON metadata line per sighting; its 'row' field is the
+                  index of that sighting's encoding in encodings.f32
+- thumbs/         JPEG thumbnails referenced by the metadata 'thumbnail' field
+- .lock           OS file lock held around each pair of appends
+
+The store expects a single writer process per directory. The file lock keeps
+rows and metadata paired if several processes do share one, but each process
+only sees its own new sightings until it is restarted; give every worker or
+shard its own SIGHTINGS_DIR instead.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ENCODING_DIM = 128
+ROW_BYTES = ENCODING_DIM * 4
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path):
+    """Exclusive cross-process lock on path (blocking)."""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SightingsStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.thumbs_dir = self.root / 'thumbs'
+        self.thumbs_dir.mkdir(exist_ok=True)
+        self.enc_path = self.root / 'encodings.f32'
+        self.meta_path = self.root / 'sightings.jsonl'
+        self.lock_path = self.root / '.lock'
+        self._lock = threading.Lock()
+        self._meta: List[Dict[str, Any]] = []
+        # Capacity-doubling buffer so appends don't copy the whole matrix
+        self._buf = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._count = 0
+        self._load()
+
+    def _load(self) -> None:
+        meta: List[Dict[str, Any]] = []
+        if self.meta_path.is_file():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        meta.append(json.loads(line))
+                    except ValueError:
+                        # A line torn by a crash mid-write; later lines are still good
+                        continue
+        encs = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        if self.enc_path.is_file():
+            raw = np.fromfile(self.enc_path, dtype=np.float32)
+            rows = raw.size // ENCODING_DIM
+            encs = raw[:rows * ENCODING_DIM].reshape(rows, ENCODING_DIM)
+
+        # Pair records with encodings by their stored row, never by position,
+        # and skip records whose row was never fully written
+        kept: List[Dict[str, Any]] = []
+        row_idx: List[int] = []
+        seen = set()
+        for i, m in enumerate(meta):
+            row = m.get('row', i)
+            if not isinstance(row, int) or not 0 <= row < encs.shape[0] or row in seen:
+                continue
+            seen.add(row)
+            kept.append(m)
+            row_idx.append(row)
+
+        self._meta = kept
+        self._buf = np.array(encs[row_idx], dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self._count = len(kept)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def new_source_id() -> str:
+        return uuid.uuid4().hex
+
+    def _save_thumbnail(self, source_id: str, thumb: Optional[np.ndarray]) -> Optional[str]:
+        if thumb is None or thumb.size == 0:
+            return None
+        from PIL import Image
+
+        src_dir = self.thumbs_dir / source_id
+        src_dir.mkdir(exist_ok=True)
+        fname = f"{uuid.uuid4().hex[:12]}.jpg"
+        Image.fromarray(thumb).save(src_dir / fname, format='JPEG')
+        return f"{source_id}/{fname}"
+
+    def add(self, source_id: str, encoding: np.ndarray, box: Tuple[int, int, int, int],
+            frame: Optional[int] = None, timestamp: Optional[float] = None,
+            thumb: Optional[np.ndarray] = None, source_name: Optional[str] = None) -> Dict[str, Any]:
+        """Append one sighting. box is (top, right, bottom, left) as returned
+        by face_recognition; timestamp is seconds into the video (if any)."""
+        enc = np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_DIM)
+        top, right, bottom, left = (int(v) for v in box)
+        thumb_ref = self._save_thumbnail(source_id, thumb)
+
+        with self._lock, _file_lock(self.lock_path):
+            with open(self.enc_path, 'ab') as f:
+                # Align past a torn partial row left by a crashed writer
+                size = f.seek(0, os.SEEK_END)
+                if size % ROW_BYTES:
+                    f.write(b'\0' * (ROW_BYTES - size % ROW_BYTES))
+                    size += ROW_BYTES - size % ROW_BYTES
+                row = size // ROW_BYTES
+                enc.tofile(f)
+            meta = {
+                'id': row,
+                'row': row,
+                'source_id': source_id,
+                'source_name': source_name,
+                'frame': frame,
+                'timestamp': timestamp,
+                'box': [top, right, bottom, left],
+                'thumbnail': thumb_ref,
+                'recorded_at': datetime.utcnow().isoformat() + 'Z',
+            }
+            with open(self.meta_path, 'a+b') as f:
+                # Terminate a torn last line so this record doesn't get glued onto it
+                size = f.seek(0, os.SEEK_END)
+                prefix = b''
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        prefix = b'\n'
+                f.write(prefix + (json.dumps(meta) + '\n').encode('utf-8'))
+
+            if self._count == self._buf.shape[0]:
+                grown = np.empty((max(64, self._count * 2), ENCODING_DIM), dtype=np.float32)
+                grown[:self._count] = self._buf[:self._count]
+                self._buf = grown
+            self._buf[self._count] = enc[0]
+            self._meta.append(meta)
+            self._count += 1
+        return meta
+
+    def search(self, queries: np.ndarray, tolerance: float, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return sightings within tolerance of any of the query encodings,
+        closest first. Multiple reference encodings of one person are treated
+        as a set: each sighting is scored by its nearest reference. A limit of
+        0 returns every hit."""
+        if limit < 0:
+            raise ValueError('limit must not be negative')
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        with self._lock:
+            n = self._count
+            encs = self._buf[:n]
+            meta = self._meta[:n]
+        if n == 0 or q.shape[0] == 0:
+            return []
+
+        # ||a - b||^2 = ||a||^2 - 2 a.b + ||b||^2, one matmul for all pairs
+        sq = (np.einsum('ij,ij->i', encs, encs)[:, None]
+              - 2.0 * encs @ q.T
+              + np.einsum('ij,ij->i', q, q)[None, :])
+        dists = np.sqrt(np.maximum(sq, 0.0)).min(axis=1)
+
+        hits = np.flatnonzero(dists < tolerance)
+        if hits.size == 0:
+            return []
+        if limit and hits.size > limit:
+            part = np.argpartition(dists[hits], limit - 1)[:limit]
+            hits = hits[part]
+        hits = hits[np.argsort(dists[hits], kind='stable')]
+
+        out = []
+        for i in hits:
+            item = dict(meta[int(i)])
+            item['distance'] = float(dists[i])
+            out.append(item)
+        return out
+
+    def thumbnail_path(self, ref: Optional[str]) -> Optional[Path]:
+        if not ref:
+            return None
+        path = (self.thumbs_dir / ref).resolve()
+        # Refs come back from clients; never serve outside thumbs/
+        if self.thumbs_dir.resolve() not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = {m['source_id'] for m in self._meta}
+            return {
+                'sightings': self._count,
+                'sources': len(sources),
+                'dir': str(self.root),
+            }